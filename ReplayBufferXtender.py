@@ -1,10 +1,92 @@
+import concurrent.futures
+import ctypes
+import errno
 import os
+import shutil
+from ctypes import wintypes
 
 import obspython as o
-import psutil
-import win32api as wapi
-import win32gui as wgui
-import win32process as wproc
+
+# Direct win32 bindings for resolving the focused window's process
+# Avoids importing psutil or pywin32 into the OBS scripting host at startup
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+_user32 = ctypes.windll.user32
+_kernel32 = ctypes.windll.kernel32
+
+# Event hook bindings for tracking foreground window changes without polling
+EVENT_SYSTEM_FOREGROUND = 0x0003
+WINEVENT_OUTOFCONTEXT = 0x0000
+
+_WinEventProcType = ctypes.WINFUNCTYPE(
+    None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+    wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+_SetWinEventHook = _user32.SetWinEventHook
+_SetWinEventHook.argtypes = [
+    wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE,
+    _WinEventProcType, wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+_SetWinEventHook.restype = wintypes.HANDLE
+
+_UnhookWinEvent = _user32.UnhookWinEvent
+_UnhookWinEvent.argtypes = [wintypes.HANDLE]
+_UnhookWinEvent.restype = wintypes.BOOL
+
+_GetForegroundWindow = _user32.GetForegroundWindow
+_GetForegroundWindow.argtypes = []
+_GetForegroundWindow.restype = wintypes.HWND
+
+_GetWindowTextW = _user32.GetWindowTextW
+_GetWindowTextW.argtypes = [wintypes.HWND, wintypes.LPWSTR, ctypes.c_int]
+_GetWindowTextW.restype = ctypes.c_int
+
+_GetWindowThreadProcessId = _user32.GetWindowThreadProcessId
+_GetWindowThreadProcessId.argtypes = [
+    wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+_GetWindowThreadProcessId.restype = wintypes.DWORD
+
+_OpenProcess = _kernel32.OpenProcess
+_OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+_OpenProcess.restype = wintypes.HANDLE
+
+_QueryFullProcessImageNameW = _kernel32.QueryFullProcessImageNameW
+_QueryFullProcessImageNameW.argtypes = [
+    wintypes.HANDLE, wintypes.DWORD,
+    wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD)]
+_QueryFullProcessImageNameW.restype = wintypes.BOOL
+
+_GetProcessTimes = _kernel32.GetProcessTimes
+_GetProcessTimes.argtypes = [
+    wintypes.HANDLE] + [ctypes.POINTER(wintypes.FILETIME)] * 4
+_GetProcessTimes.restype = wintypes.BOOL
+
+_CloseHandle = _kernel32.CloseHandle
+_CloseHandle.argtypes = [wintypes.HANDLE]
+_CloseHandle.restype = wintypes.BOOL
+
+# Direct version.dll bindings for reading an executable's version resource
+# Loads the resource into one buffer instead of once per queried value
+FILE_VER_GET_NEUTRAL = 0x02
+FILE_VER_GET_PREFETCHED = 0x04
+
+_version = ctypes.windll.version
+
+_GetFileVersionInfoSizeExW = _version.GetFileVersionInfoSizeExW
+_GetFileVersionInfoSizeExW.argtypes = [
+    wintypes.DWORD, wintypes.LPCWSTR, ctypes.POINTER(wintypes.DWORD)]
+_GetFileVersionInfoSizeExW.restype = wintypes.DWORD
+
+_GetFileVersionInfoExW = _version.GetFileVersionInfoExW
+_GetFileVersionInfoExW.argtypes = [
+    wintypes.DWORD, wintypes.LPCWSTR,
+    wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID]
+_GetFileVersionInfoExW.restype = wintypes.BOOL
+
+_VerQueryValueW = _version.VerQueryValueW
+_VerQueryValueW.argtypes = [
+    wintypes.LPCVOID, wintypes.LPCWSTR,
+    ctypes.POINTER(wintypes.LPVOID), ctypes.POINTER(wintypes.UINT)]
+_VerQueryValueW.restype = wintypes.BOOL
 
 
 class ReplayBufferXtender:
@@ -15,8 +97,27 @@ class ReplayBufferXtender:
     base_dir = None
     prepend_window_name = True
     use_windowsapps = True
-    disallowed_chars = ["\\", "/", ":", '*',
-                        "?", '"', "<", ">", "|", ".exe", "$"]
+    # Chars disallowed in Windows file names, as a frozenset for O(1)
+    # membership tests; the ".exe" suffix is not a single char and is
+    # handled separately in sanitize_string
+    disallowed_chars = frozenset('\\/:*?"<>|$')
+    # Deletion table built from the set above, so sanitize_string can strip
+    # all of them in one pass
+    _translate_table = str.maketrans("", "", "".join(disallowed_chars))
+    # Maps a process ID to its (creation time, application name)
+    # Creation time is kept so a recycled PID is never attributed to the old process
+    _app_name_cache: dict[int, tuple[int, str]] = {}
+    # Maps a window handle to its (raw title, sanitized title)
+    # The raw title is kept to detect when the window was retitled
+    _hwnd_title_cache: dict[int, tuple[str, str]] = {}
+    # Maps an executable path to its (mtime, sanitized FileDescription)
+    # The mtime is kept so the entry is refreshed when the app is updated
+    _desc_cache: dict[str, tuple[float, str]] = {}
+    # Output directories already created this session, so repeat saves for
+    # the same app skip the mkdir syscall entirely
+    _ensured_dirs: set[str] = set()
+    # Last foreground window handle reported by the win event hook
+    _last_focused_hwnd: int = None
 
     def __init__(self) -> None:
         pass
@@ -28,12 +129,14 @@ class ReplayBufferXtender:
         if event == o.OBS_FRONTEND_EVENT_REPLAY_BUFFER_SAVED:
             try:
                 self.move_video()
-            except BaseException as e:
+            except Exception as e:
                 print(e)
 
-    def get_last_replay_path(self) -> str:
+    def _call_replay_proc(self, *field_names: str) -> dict[str, str]:
         """
-        Retrieve last replay buffer output
+        Internal, calls get_last_replay on the Replay Buffer output\n
+        Reads all requested calldata fields from one proc call so callers
+        batch their reads instead of fanning out into repeated calls
         """
 
         replay_buffer = o.obs_frontend_get_replay_buffer_output()
@@ -45,67 +148,160 @@ class ReplayBufferXtender:
             name="get_last_replay",
             params=cd
         )
-        path = o.calldata_string(data=cd, name="path")
+        fields = {name: o.calldata_string(data=cd, name=name)
+                  for name in field_names}
 
         o.obs_output_release(replay_buffer)
-        return path
+        return fields
 
-    def get_focused_window_name(self) -> str:
+    def get_last_replay_path(self) -> str:
         """
-        Uses the win32api to grab the display name of the currently focused window
+        Retrieve last replay buffer output
         """
 
-        # Get the window text
-        w_text = wgui.GetWindowText(wgui.GetForegroundWindow())
+        return self._call_replay_proc("path")["path"]
 
-        # Sanitize text and return
-        return self.sanitize_string(w_text)
+    def get_focused_window_handle(self) -> int:
+        """
+        Returns the foreground window handle recorded by the win event hook\n
+        Falls back to polling if no foreground change has fired yet
+        """
+        return self._last_focused_hwnd or _GetForegroundWindow()
 
-    def get_focused_window_executable_path(self) -> str:
+    def get_focused_window_name(self, hwnd: int) -> str:
         """
-        Uses the win32api and psutil to grab the executable name of the currently focused window
+        Uses the win32api to grab the display name of the given window
         """
 
-        # Get the handle for the foreground window
-        hwnd = wgui.GetForegroundWindow()
+        # Get the window text
+        buf = ctypes.create_unicode_buffer(512)
+        _GetWindowTextW(hwnd, buf, len(buf))
+        w_text = buf.value
 
-        # Get the process ID of the window
-        _, pid = wproc.GetWindowThreadProcessId(hwnd)
+        # Skip sanitizing if the title is unchanged since the last save
+        cached = self._hwnd_title_cache.get(hwnd)
+        if cached is not None and cached[0] == w_text:
+            return cached[1]
 
-        # Get the process path from the process ID
-        process = psutil.Process(pid)
+        # Sanitize text, cache for this window, and return
+        sanitized = self.sanitize_string(w_text)
+        self._hwnd_title_cache[hwnd] = (w_text, sanitized)
+        return sanitized
 
-        return process.exe()
+    def get_focused_process_info(self, pid: int) -> tuple[int, str]:
+        """
+        Uses the win32api directly to grab the creation time and executable path
+        of a process by its ID, batching both queries behind one process handle
+        """
 
-    def get_focused_application_name(self) -> str:
+        handle = _OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            raise ctypes.WinError()
+
+        try:
+            # Query the full executable path
+            buf = ctypes.create_unicode_buffer(32768)
+            size = wintypes.DWORD(len(buf))
+            if not _QueryFullProcessImageNameW(handle, 0, buf, ctypes.byref(size)):
+                raise ctypes.WinError()
+
+            # Query the creation time for PID reuse detection
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not _GetProcessTimes(handle, *map(ctypes.byref, times)):
+                raise ctypes.WinError()
+            creation = times[0]
+            create_time = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+        finally:
+            _CloseHandle(handle)
+
+        return create_time, buf.value
+
+    def get_file_description(self, exe_path: str) -> str:
         """
-        Uses the win32api to grab the name of the currently focused window using file version info
+        Reads the FileDescription string from an executable's version resource\n
+        Loads the resource into one buffer, then queries it for the translation
+        table and the localized description
+        """
+
+        flags = FILE_VER_GET_NEUTRAL | FILE_VER_GET_PREFETCHED
+
+        # Load the whole version resource once
+        handle = wintypes.DWORD()
+        size = _GetFileVersionInfoSizeExW(flags, exe_path, ctypes.byref(handle))
+        if not size:
+            return ""
+        buf = ctypes.create_string_buffer(size)
+        if not _GetFileVersionInfoExW(flags, exe_path, 0, size, buf):
+            return ""
+
+        # Read the first language and codepage pair from the translation table
+        ptr = wintypes.LPVOID()
+        length = wintypes.UINT()
+        if not _VerQueryValueW(
+                buf, "\\VarFileInfo\\Translation",
+                ctypes.byref(ptr), ctypes.byref(length)) or length.value < 4:
+            return ""
+        language, codepage = ctypes.cast(
+            ptr, ctypes.POINTER(wintypes.WORD * 2)).contents
+
+        # Read the localized FileDescription from the same buffer
+        stringFileInfo = f"\\StringFileInfo\\{language:04X}{codepage:04X}\\FileDescription"
+        if not _VerQueryValueW(
+                buf, stringFileInfo, ctypes.byref(ptr), ctypes.byref(length)):
+            return ""
+
+        return ctypes.wstring_at(ptr, length.value).rstrip("\x00")
+
+    def get_focused_application_name(self, hwnd: int) -> str:
+        """
+        Uses the win32api to grab the name of the given window using file version info
         With help from StackOverflow: https://stackoverflow.com/a/31119785
         """
 
-        exe_path = self.get_focused_window_executable_path()
+        # Get the process ID of the window
+        pid = wintypes.DWORD()
+        _GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        pid = pid.value
 
+        # Some processes (e.g. elevated ones) cannot be opened at all;
+        # fall back to the window text in that case
+        try:
+            create_time, exe_path = self.get_focused_process_info(pid)
+        except OSError:
+            return ""
+
+        # Resolving the name involves several cross-process calls and disk IO,
+        # so reuse the cached result if this PID still belongs to the same process
+        cached = self._app_name_cache.get(pid)
+        if cached is not None and cached[0] == create_time:
+            return cached[1]
+
+        # The version resource is immutable for a given file, so reuse the
+        # description resolved for this executable unless it has been updated
+        # Some exes (e.g. UWP apps under WindowsApps) cannot even be stat'd;
+        # fall back to the window text for those too
         try:
-            language, codepage = wapi.GetFileVersionInfo(
-                exe_path, '\\VarFileInfo\\Translation')[0]
-            stringFileInfo = u'\\StringFileInfo\\%04X%04X\\%s' % (
-                language, codepage, "FileDescription")
-            application_name = wapi.GetFileVersionInfo(
-                exe_path, stringFileInfo)
-        except:
-            application_name = ""
-
-        # Sanitize text and return
-        return self.sanitize_string(application_name)
+            mtime = os.stat(exe_path).st_mtime
+        except OSError:
+            return ""
+        cached_desc = self._desc_cache.get(exe_path)
+        if cached_desc is not None and cached_desc[0] == mtime:
+            application_name = cached_desc[1]
+        else:
+            # Read the application name from the executable's version resource
+            application_name = self.sanitize_string(
+                self.get_file_description(exe_path))
+            self._desc_cache[exe_path] = (mtime, application_name)
+
+        # Cache for this process and return
+        self._app_name_cache[pid] = (create_time, application_name)
+        return application_name
 
     def sanitize_string(self, txt: str) -> str:
         """
         Removes chars from strings that are disallowed in Windows file names
         """
-        for char in self.disallowed_chars:
-            if char in txt:
-                txt = txt.replace(char, "")
-        return txt.strip()
+        return txt.replace(".exe", "").translate(self._translate_table).strip()
 
     def move_video(self) -> None:
         """
@@ -117,10 +313,13 @@ class ReplayBufferXtender:
         # Parse into directory and file name
         lr_orig_dir, lr_fname = os.path.split(lr_orig_fullpath)
 
+        # Resolve the focused window handle once for the whole event
+        hwnd = self.get_focused_window_handle()
+
         # First try to get the name from the executable's version information resource
         # If that fails, try to get the name from the window text
-        sub_dir = self.get_focused_application_name()
-        sub_dir = sub_dir if sub_dir != "" else self.get_focused_window_name()
+        sub_dir = self.get_focused_application_name(hwnd)
+        sub_dir = sub_dir if sub_dir != "" else self.get_focused_window_name(hwnd)
 
         # Cases where no valid window name is found
         if not sub_dir:
@@ -129,8 +328,8 @@ class ReplayBufferXtender:
                 sub_dir = "Windowsapps"
             # Place the file in the base directory and bail out
             elif self.base_dir:
-                os.rename(lr_orig_fullpath, os.path.join(
-                    self.base_dir, lr_fname))
+                _io_pool.submit(self._do_rename, lr_orig_fullpath,
+                                f"{self.base_dir}\\{lr_fname}")
                 return
 
         # Replace the word "Replay" in the file name with the window name
@@ -143,17 +342,44 @@ class ReplayBufferXtender:
         else:
             lr_base_dir = lr_orig_dir
 
-        # Create final directory
-        lr_dir = os.path.join(lr_base_dir, sub_dir)
-        if not os.path.exists(lr_dir):
-            os.mkdir(lr_dir)
+        # Create the final directory and move the file off the event thread
+        # The focused window info above must stay synchronous, but the disk IO
+        # does not need to block OBS
+        # Plain concat is safe here since sub_dir and lr_fname are already
+        # sanitized of path separators, and skips ntpath.join's drive parsing
+        lr_dir = f"{lr_base_dir}\\{sub_dir}"
+        _io_pool.submit(self._do_rename, lr_orig_fullpath,
+                        f"{lr_dir}\\{lr_fname}", lr_dir)
 
-        # Move the file
-        os.rename(lr_orig_fullpath, os.path.join(lr_dir, lr_fname))
+    def _do_rename(self, src: str, dest: str, dest_dir: str = None) -> None:
+        """
+        Internal, runs on the IO worker thread\n
+        Creates the destination directory if needed and moves the file
+        """
+        try:
+            if dest_dir is not None and dest_dir not in self._ensured_dirs:
+                os.makedirs(dest_dir, exist_ok=True)
+                self._ensured_dirs.add(dest_dir)
+            try:
+                os.replace(src, dest)
+            except OSError as e:
+                # replace cannot cross volumes; fall back to a copy + delete,
+                # which is safe to be slow here on the worker thread
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.move(src, dest)
+        except Exception as e:
+            print(e)
 
 
 inst = ReplayBufferXtender()
 
+# Single worker used to run file moves off OBS's frontend event thread
+_io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+# Handle for the foreground-change event hook, set while the script is loaded
+_win_event_hook = None
+
 
 def script_description() -> str:
     return """
@@ -169,12 +395,28 @@ def script_description() -> str:
 
 
 def script_load(_) -> None:
+    global _win_event_hook
+
     o.obs_frontend_add_event_callback(on_event)
 
+    # Follow foreground changes event-driven instead of polling at save time
+    _win_event_hook = _SetWinEventHook(
+        EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND,
+        None, _win_event_proc, 0, 0, WINEVENT_OUTOFCONTEXT)
+
 
 def script_unload() -> None:
+    global _win_event_hook
+
     o.obs_frontend_remove_event_callback(on_event)
 
+    if _win_event_hook:
+        _UnhookWinEvent(_win_event_hook)
+        _win_event_hook = None
+
+    # Let any in-flight file move finish before the script goes away
+    _io_pool.shutdown(wait=True)
+
 
 def script_properties() -> any:
     p = o.obs_properties_create()
@@ -222,7 +464,9 @@ def script_defaults(s) -> None:
 
 
 def script_update(s) -> None:
-    inst.base_dir = o.obs_data_get_string(s, "baseSavePath")
+    # Normalize the base path once here rather than on every save
+    base_dir = o.obs_data_get_string(s, "baseSavePath")
+    inst.base_dir = os.path.normpath(base_dir) if base_dir else ""
     inst.use_windowsapps = o.obs_data_get_bool(s, "useWindowsapps")
     inst.prepend_window_name = o.obs_data_get_bool(s, "prependWindowName")
 
@@ -234,3 +478,17 @@ def on_event(event, *_) -> None:
     """
 
     inst.event_handler(event)
+
+
+def on_foreground_changed(hook, event, hwnd, id_object, id_child, thread, time) -> None:
+    """
+    Called by Windows whenever the foreground window changes\n
+    Keeps the focused window handle current so saves just read it
+    """
+
+    inst._last_focused_hwnd = hwnd
+
+
+# Keep a reference to the callback wrapper so it is not garbage collected
+# while the hook is installed
+_win_event_proc = _WinEventProcType(on_foreground_changed)